@@ -0,0 +1,47 @@
+# coding: utf-8
+"""Command-line interface for PyGDX.
+
+Usage::
+
+    python -m gdx convert in.gdx out_dir/ --format parquet --workers 4
+
+Run ``python -m gdx --help`` for details.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import argparse
+
+
+def main(args=None):
+    """Run the command-line interface with *args* (default: from sys.argv)."""
+    parser = argparse.ArgumentParser(
+        prog='python -m gdx',
+        description='GAMS Data Exchange (GDX) file access.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    p = subparsers.add_parser(
+        'convert', help='convert each symbol to a Parquet or Arrow IPC file')
+    p.add_argument('filename', help='GDX file to convert')
+    p.add_argument('out_dir', help='directory for output files')
+    p.add_argument('--format', choices=['parquet', 'arrow'],
+                   default='parquet', help='output format (default: parquet)')
+    p.add_argument('--workers', type=int, default=1,
+                   help='number of worker processes (default: 1)')
+    p.add_argument('--batch-size', type=int, default=65536,
+                   help='records per batch/row group (default: 65536)')
+
+    args = parser.parse_args(args)
+
+    if args.command == 'convert':
+        from .convert import convert
+        for path in convert(args.filename, args.out_dir, args.format,
+                            args.workers, args.batch_size):
+            print(path)
+    else:
+        parser.print_help()
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,8 +1,10 @@
 # coding: utf-8
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
+from os import getpid
 from os.path import dirname
 import sys
+from threading import Lock
 
 import gdxcc
 
@@ -13,6 +15,8 @@ install_aliases()
 __all__ = [
     'GDX',
     'gdxcc',
+    'pool',
+    'special_str',
     'type_str',
     'vartype_str',
     ]
@@ -44,25 +48,68 @@ vartype_str = {
     }
 
 
+#: String representations of API constants for GAMS S(pecial) V(alues)
+special_str = {
+    gdxcc.GMS_SV_UNDEF: 'UNDF',
+    gdxcc.GMS_SV_NA: 'NA',
+    gdxcc.GMS_SV_PINF: '+INF',
+    gdxcc.GMS_SV_MINF: '-INF',
+    gdxcc.GMS_SV_EPS: 'EPS',
+    }
+
+
+#: Default representations of GAMS special values, by their string names
+special_default = {
+    'UNDF': float('nan'),
+    'NA': float('nan'),
+    '+INF': float('inf'),
+    '-INF': float('-inf'),
+    'EPS': -0.0,
+    }
+
+
+_gams_dir_cache = None
+
+
 def _gams_dir():
     """Locate GAMS on a POSIX system.
 
     Returns the path to the  executable is a required argument of
-    ``gdxCreateD``, the method for connecting to the GDX API.
+    ``gdxCreateD``, the method for connecting to the GDX API. The path is only
+    searched for once per process.
+    """
+    global _gams_dir_cache
+    if _gams_dir_cache is None:
+        _gams_dir_cache = dirname(which('gams'))
+    return _gams_dir_cache
+
+
+def _column_names(domain):
+    """Return names for columns holding the labels of a Symbol over *domain*.
+
+    Repeated Set names in *domain* are suffixed with the dimension number.
     """
-    return dirname(which('gams'))
+    result = []
+    for i, d in enumerate(domain):
+        result.append(d if d not in result else '{}_{}'.format(d, i))
+    return result
 
 
 class GDX(object):
     """Wrapper around the `GDX API`_."""
     #: Methods that conform to the semantics of :func:`call`.
     __valid = [
+        'Close',
         'CreateD',
+        'DataReadDone',
+        'DataReadRaw',
+        'DataReadRawStart',
         'DataReadStr',
         'DataReadStrStart',
         'ErrorCount',
         'ErrorStr',
         'FileVersion',
+        'Free',
         'GetElemText',
         'GetLastError',
         'OpenRead',
@@ -71,6 +118,7 @@ class GDX(object):
         'SymbolInfo',
         'SymbolInfoX',
         'SystemInfo',
+        'UMUelGet',
         ]
 
     def __init__(self):
@@ -128,3 +176,74 @@ class GDX(object):
             return wrapper
         else:
             raise AttributeError(name)
+
+
+def _map_special(values, representation=special_default):
+    """Replace GAMS special values in the array *values*, in place.
+
+    *representation* maps the names in :data:`special_str` to floats. Returns
+    :obj:`None` if *values* contains no special values; otherwise a tuple of
+    the positions of the special values, and their kinds: the position of
+    each in ``sorted(special_str)``.
+    """
+    import numpy
+
+    # All special values are 1e300 or more
+    positions = numpy.flatnonzero(values >= gdxcc.GMS_SV_UNDEF)
+    if len(positions) == 0:
+        return None
+
+    sv = numpy.array(sorted(special_str))
+    kinds = numpy.searchsorted(sv, values[positions]).clip(max=len(sv) - 1)
+    # Ignore other large values
+    found = sv[kinds] == values[positions]
+    positions, kinds = positions[found], kinds[found].astype(numpy.int8)
+
+    values[positions] = numpy.array([representation[special_str[v]] for v in
+                                     sv])[kinds]
+    return (positions, kinds) if len(positions) else None
+
+
+class Pool(object):
+    """Pool of reusable :class:`GDX` handles.
+
+    Creating a :class:`GDX` object loads and initializes the GDX library.
+    :class:`Pool` keeps up to *size* closed handles, so that opening many files
+    in turn costs only the file read:
+
+    >>> api = pool.acquire()
+    >>> api.open_read('example.gdx')
+    >>> # ...
+    >>> pool.release(api)
+    """
+    def __init__(self, size=8):
+        """Constructor."""
+        self.size = size
+        self._idle = []
+        self._lock = Lock()
+        self._pid = getpid()
+
+    def acquire(self):
+        """Return an idle :class:`GDX` handle, or a new one."""
+        with self._lock:
+            if self._pid != getpid():
+                # In a forked child process; don't share handles with the
+                # parent
+                self._idle = []
+                self._pid = getpid()
+            if len(self._idle):
+                return self._idle.pop()
+        return GDX()
+
+    def release(self, api):
+        """Close any file open with *api* and return it to the pool."""
+        api.close()
+        with self._lock:
+            if len(self._idle) < self.size and self._pid == getpid():
+                self._idle.append(api)
+                return
+        api.free()
+
+
+#: Process-wide :class:`Pool` of GDX handles, used by :class:`gdx.File`.
+pool = Pool()
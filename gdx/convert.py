@@ -0,0 +1,177 @@
+# coding: utf-8
+"""Streaming conversion of GDX files to Apache Parquet or Arrow IPC files.
+
+Records are read directly from the GDX API in batches, without constructing a
+:class:`gdx.File`, so memory use is bounded by the batch size and the number
+of labels (UELs) in the file, regardless of the size of the file.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import logging
+from multiprocessing import Pool as ProcessPool
+import os
+
+from .api import _column_names, _map_special, gdxcc, pool
+from .pycompat import range
+
+
+logger = logging.getLogger(__name__)
+
+
+__all__ = [
+    'convert',
+    ]
+
+
+#: File name extensions for each output format.
+extension = {
+    'parquet': 'parquet',
+    'arrow': 'arrow',
+    }
+
+
+def _uels(api):
+    """Return an Arrow array of all labels (UELs) in the file open in *api*.
+
+    Position *i* of the result contains the UEL numbered *i* + 1.
+    """
+    import pyarrow as pa
+    _, uel_count = api.system_info()
+    return pa.array([api.call('UMUelGet', i)[0] for i in
+                     range(1, uel_count + 1)], type=pa.string())
+
+
+def _convert_symbol(api, index, uels, out_dir, format, batch_size):
+    """Convert the *index*-th Symbol in the file open in *api*.
+
+    Returns the path of the file written, or :obj:`None` if the Symbol is
+    not converted.
+    """
+    import numpy
+    import pyarrow as pa
+
+    name, dim, type_code = api.symbol_info(index)
+    if type_code not in (gdxcc.GMS_DT_SET, gdxcc.GMS_DT_PAR,
+                         gdxcc.GMS_DT_VAR) or index == 0:
+        # Skip '*', Equations and Aliases
+        return None
+
+    try:
+        domain = api.symbol_get_domain_x(index)
+    except Exception:  # pragma: no cover
+        domain = ['*'] * dim
+    columns = _column_names(domain)
+
+    # Labels are dictionary-encoded. Parameters and Variables have a 'value'
+    # column.
+    fields = [pa.field(c, pa.dictionary(pa.int32(), pa.string())) for c in
+              columns]
+    if type_code != gdxcc.GMS_DT_SET:
+        fields.append(pa.field('value', pa.float64()))
+    schema = pa.schema(fields)
+
+    path = os.path.join(out_dir, '{}.{}'.format(name, extension[format]))
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, schema)
+    else:
+        writer = pa.ipc.new_file(path, schema)
+
+    records = api.data_read_raw_start(index)
+    logger.info('Converting {} ({} records) to {}'
+                .format(name, records, path))
+    try:
+        for start in range(0, max(records, 1), batch_size):
+            n = min(batch_size, records - start)
+            keys = numpy.empty((dim, n), dtype=numpy.int32)
+            values = numpy.empty(n)
+            for i in range(n):
+                keys[:, i], value, _ = api.data_read_raw()
+                values[i] = value[gdxcc.GMS_VAL_LEVEL]
+            # UEL numbers start from 1
+            keys -= 1
+            _map_special(values)
+
+            if format == 'parquet':
+                # Parquet writes the dictionary of each column in every row
+                # group; use only the labels appearing in this batch
+                arrays = []
+                for j in range(dim):
+                    used, codes = numpy.unique(keys[j], return_inverse=True)
+                    arrays.append(pa.DictionaryArray.from_arrays(
+                        codes.astype(numpy.int32), uels.take(used)))
+            else:
+                # The Arrow IPC file format requires the same dictionary for
+                # every batch
+                arrays = [pa.DictionaryArray.from_arrays(keys[j], uels) for j
+                          in range(dim)]
+            if type_code != gdxcc.GMS_DT_SET:
+                arrays.append(pa.array(values))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    finally:
+        api.data_read_done()
+        writer.close()
+
+    return path
+
+
+def _convert_symbols(filename, indices, out_dir, format, batch_size):
+    """Convert the Symbols at *indices* in *filename*."""
+    api = pool.acquire()
+    try:
+        api.open_read(filename)
+        uels = _uels(api)
+        return [_convert_symbol(api, index, uels, out_dir, format, batch_size)
+                for index in indices]
+    finally:
+        pool.release(api)
+
+
+def convert(filename, out_dir, format='parquet', workers=1,
+            batch_size=65536):
+    """Convert each Symbol in the GDX file *filename* to a file in *out_dir*.
+
+    One file named ``<symbol>.parquet`` (*format* 'parquet') or
+    ``<symbol>.arrow`` (*format* 'arrow', the Arrow IPC file format) is written
+    for each Set, Parameter and Variable. Each file has one column per
+    dimension, containing the dictionary-encoded labels, and, except for Sets,
+    a column 'value', in which GAMS special values are replaced as described
+    for :class:`gdx.File`. Records are written in batches of *batch_size*,
+    which also gives the row group size of Parquet files.
+
+    If *workers* is more than 1, Symbols are converted in parallel by that
+    number of processes.
+
+    Returns a list of the paths written. Requires :mod:`pyarrow`.
+    """
+    if format not in extension:
+        raise ValueError('format must be one of {}; got {!r}'
+                         .format(sorted(extension), format))
+    filename = str(filename)
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    api = pool.acquire()
+    try:
+        api.open_read(filename)
+        symbol_count, _ = api.system_info()
+    finally:
+        pool.release(api)
+
+    # Distribute Symbols round-robin among the workers
+    workers = max(1, min(workers, symbol_count))
+    chunks = [list(range(1 + i, symbol_count + 1, workers)) for i in
+              range(workers)]
+    args = [(filename, c, out_dir, format, batch_size) for c in chunks]
+
+    if workers == 1:
+        results = [_convert_symbols(*args[0])]
+    else:
+        processes = ProcessPool(workers)
+        try:
+            results = processes.starmap(_convert_symbols, args)
+        finally:
+            processes.close()
+            processes.join()
+
+    return sorted(path for paths in results for path in paths if path)
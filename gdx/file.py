@@ -0,0 +1,1508 @@
+# coding: utf-8
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+from fnmatch import fnmatchcase
+import hashlib
+import logging
+import os
+import tempfile
+from weakref import WeakValueDictionary
+
+import numpy
+import pandas
+import xarray as xr
+
+from .pycompat import (install_aliases, filter, finalize, raise_from, range,
+                       super, zip)
+install_aliases()
+
+from .api import (_column_names, _map_special, gdxcc, pool, special_default,
+                  special_str, type_str, vartype_str)
+
+
+logger = logging.getLogger(__name__)
+debug = logger.debug
+info = logger.info
+
+
+__all__ = [
+    'File',
+    ]
+
+
+def _match(name, patterns):
+    """Return :obj:`True` if *name* matches any of *patterns*.
+
+    Each pattern is either a glob pattern, or a compiled regular expression
+    that must match at the start of *name*.
+    """
+    for pattern in patterns:
+        if hasattr(pattern, 'match'):
+            if pattern.match(name):
+                return True
+        elif fnmatchcase(name, pattern):
+            return True
+    return False
+
+
+class _Fingerprint(object):
+    """Fingerprint of the records of a Symbol, computed incrementally.
+
+    Records are added as integer codes: the positions of their labels among
+    the distinct elements along each dimension, in order of first appearance.
+    The records can be added in batches of any size, with the same result.
+    """
+    def __init__(self):
+        self._codes = hashlib.sha1()
+        self._values = hashlib.sha1()
+
+    def update(self, codes, values):
+        """Add records with (records × dim) *codes*, and *values*."""
+        self._codes.update(numpy.ascontiguousarray(codes, dtype=numpy.int64)
+                           .tobytes())
+        self._values.update(numpy.ascontiguousarray(values, dtype=float)
+                            .tobytes())
+
+    def hexdigest(self, elements):
+        """Return the fingerprint, given the lists of distinct *elements*."""
+        result = hashlib.sha1()
+        for e in elements:
+            result.update(hashlib.sha1(''.join(label + '\0' for label in e)
+                                       .encode('utf-8')).digest())
+        for h in self._codes, self._values:
+            result.update(h.digest())
+        return result.hexdigest()
+
+
+#: Process-wide store of coordinates and dense arrays, addressed by content;
+#: used by :class:`File` with *dedupe*. Entries are discarded when no longer
+#: referenced by any File.
+_store = WeakValueDictionary()
+
+
+#: Number of records scattered at once into, or elements filled in, a
+#: :py:class:`numpy.memmap`; used by :class:`File` with *mmap*.
+_mmap_batch = 2 ** 16
+
+
+def _occupied(data, axis):
+    """Return the positions along *axis* of *data* holding any records.
+
+    *data* is the dense array of a Set, :obj:`False` where there are no
+    records, or of a Parameter, ``nan`` where there are no records. It is
+    read in blocks, so that no other array of the same size is allocated.
+    """
+    result = numpy.zeros(data.shape[axis], dtype=bool)
+    other = tuple(a for a in range(data.ndim) if a != axis)
+    step = max(1, _mmap_batch // (int(numpy.prod(data.shape[1:])) or 1))
+    for start in range(0, data.shape[0], step):
+        block = data[start:start + step]
+        found = (block if data.dtype == bool else
+                 ~numpy.isnan(block)).any(axis=other)
+        if axis == 0:
+            result[start:start + step] = found
+        else:
+            result |= found
+    return numpy.flatnonzero(result)
+
+
+def _reduce_coo(data, keep):
+    """Return the :py:class:`sparse.COO` array *data*, reduced to *keep*.
+
+    *keep* contains, for each dimension, the positions to keep, or
+    :obj:`None` to keep all.
+    """
+    import sparse
+    coords = data.coords.copy()
+    shape = list(data.shape)
+    mask = numpy.ones(coords.shape[1], dtype=bool)
+    for i, k in enumerate(keep):
+        if k is None:
+            continue
+        # New position of each old position; -1 if not kept
+        new = numpy.full(shape[i], -1, dtype=coords.dtype)
+        new[k] = numpy.arange(len(k))
+        coords[i] = new[coords[i]]
+        mask &= coords[i] >= 0
+        shape[i] = len(k)
+    return sparse.COO(coords[:, mask], data.data[mask], shape=tuple(shape),
+                      fill_value=data.fill_value)
+
+
+class File(xr.Dataset):
+    """Load the file at *filename* into memory.
+
+    If *lazy* is ``True`` (default), then the data for GDX Parameters is not
+    loaded until each individual parameter is first accessed; otherwise all
+    parameters except those listed in *skip* (default: empty) are loaded
+    immediately.
+
+    Symbols to load when the file is opened can also be selected by name and
+    type. *include* and *exclude* are lists of glob patterns (e.g.
+    ``'cost_*'``) or compiled regular expressions; *types* is a list of type
+    names, e.g. ``['parameter']``; see :data:`gdx.api.type_str`. Only Sets
+    selected, plus the Sets in the domains of the selected Symbols (and of
+    those Sets, etc.), are loaded, instead of every Set in the file; if
+    *lazy* is ``False``, the other selected Symbols are also loaded. Symbols
+    matching *exclude* or in *skip* are never selected. Symbols not loaded can
+    still be accessed lazily.
+
+    If *implicit* is ``True`` (default) then, for each dimension of any GDX
+    Parameter declared over '*' (the universal set), an implicit set is
+    constructed, containing only the labels appearing in the respective
+    dimension of that parameter. Implicit sets are named ``_star_<hash>``,
+    where ``<hash>`` is derived from their contents, and are shared between
+    all Parameters with the same labels along a dimension.
+
+    .. note::
+
+       For instance, the GAMS Parameter ``foo(*,*,*)`` is loaded as
+       ``foo(_star_1a2b3c4d,_star_5e6f7a8b,_star_9c0d1e2f)``, where the first
+       implicit set contains only labels appearing along the first dimension
+       of ``foo``, etc. This workaround is essential for GDX files where ``*``
+       is large; otherwise, loading ``foo`` as declared raises
+       :py:class:`MemoryError`.
+
+    Identical coordinates, e.g. two Sets with the same elements, share a
+    single :py:class:`pandas.Index` in memory.
+
+    Before a Parameter or multi-dimensional Set is loaded, the size of a dense
+    array over its (inferred) domain is computed. If this is more than
+    *max_bytes* (default: 1 GiB), or the fraction of the array filled by
+    records is less than *density* (default: 0), the Symbol is stored as a
+    :py:class:`sparse.COO` array if :py:mod:`sparse` is installed; otherwise
+    as a 'long' 1-D array along a dimension ``_<name>_record``, indexed by a
+    :py:class:`pandas.MultiIndex` of labels. The layout chosen is stored in
+    the ``_gdx_layout`` attribute.
+
+    If *mmap* is given, arrays larger than *max_bytes*, but dense enough, are
+    instead stored in a :py:class:`numpy.memmap` with layout 'mmap', so that
+    they are paged in from disk as needed, and may be larger than memory. If
+    *mmap* is ``True``, a temporary file is used for each; if it is the path
+    to a directory, a new file ``<name>-<random>.npy`` is created there for
+    each, which can be reopened with :py:func:`numpy.load`. Its path is stored
+    in the ``_gdx_mmap_file`` attribute; these files are not removed. The
+    records of these Symbols are read in batches and written directly to the
+    file, without being held in memory.
+
+    A fingerprint of the records of each Symbol is stored in the
+    ``_gdx_fingerprint`` attribute. If *dedupe* is ``True``, the coordinates
+    of 1-D Sets and the dense arrays of other Symbols are also kept in a
+    process-wide store, addressed by content: Symbols identical to those in
+    another :class:`File` opened with *dedupe* share the same memory, and are
+    not converted again. These arrays are read-only.
+
+    GAMS special values in Parameters are replaced by the floats given in
+    *special*, a dict with the keys 'UNDF', 'NA', '+INF', '-INF' and 'EPS'.
+    By default, UNDF and NA are ``nan``, the infinities are ``inf`` and
+    ``-inf``, and EPS is ``-0.0``: equal to zero, but distinguishable using
+    :py:func:`numpy.signbit`. Use :meth:`special_values` to retrieve the
+    records which contained special values.
+
+    The GDX handle used to read the file is taken from :data:`gdx.api.pool`,
+    and returned by :meth:`close`. A :class:`File` can also be used as a
+    context manager:
+
+    >>> with File('example.gdx') as f:
+    ...     f['myparam']
+
+    """
+    # For the benefit of xr.Dataset.__getattr__
+    _api = None
+    _release = None
+    _filename = ''
+    _index = []
+    _state = {}
+    _alias = {}
+    _records = {}
+    _interned = {}
+    _members = {}
+    _specials = {}
+    _implicit = False
+    _density = 0.
+    _max_bytes = 2 ** 30
+    _dedupe = False
+    _special = special_default
+    _mmap = False
+
+    def __init__(self, filename='', lazy=True, implicit=True, skip=set(),
+                 density=0., max_bytes=2 ** 30, dedupe=False, special={},
+                 include=None, exclude=None, types=None, mmap=False):
+        """Constructor."""
+        super(File, self).__init__()  # Invoke Dataset constructor
+
+        # Check arguments before acquiring a handle that must be released
+        if types is not None and not set(types) <= set(type_str.values()):
+            raise ValueError('types must be among {}; got {!r}'
+                             .format(sorted(type_str.values()), types))
+
+        # Open the file using a pooled handle to the GDX API. Store an absolute
+        # path, so that the file is found after the working directory changes,
+        # or by other processes that unpickle the File
+        self._filename = os.path.abspath(str(filename))
+        self._open()
+
+        # Initialize private variables
+        self._records = {}
+        self._interned = {}
+        self._members = {}
+        self._specials = {}
+        self._implicit = implicit
+        self._density = density
+        self._max_bytes = max_bytes
+        self._dedupe = dedupe
+        self._special = dict(special_default)
+        self._special.update(special)
+        self._mmap = mmap
+
+        # Read symbols, and select those to load
+        symbols = self._read_symbol_table()
+        excluded = set(skip) | set(name for name, _ in symbols if
+                                   _match(name, exclude or []))
+        selected = [(name, type_code) for name, type_code in symbols if
+                    name not in excluded and
+                    (include is None or _match(name, include)) and
+                    (types is None or type_str[type_code] in types)]
+        load = set(name for name, type_code in selected if
+                   type_code == gdxcc.GMS_DT_SET or not lazy)
+        load |= self._dependencies(name for name, _ in selected) - excluded
+
+        # Load in the order of the file
+        for name in filter(None, self._index):
+            if name in load:
+                self._load_symbol_data(name)
+
+    def _read_symbol_table(self):
+        """Read basic information and the table of Symbols in the file.
+
+        Returns a list of (name, type_code) for every Symbol.
+        """
+        # Basic information about the GDX file
+        v, p = self._api.file_version()
+        sc, ec = self._api.system_info()
+        self.attrs['version'] = v.strip()
+        self.attrs['producer'] = p.strip()
+        self.attrs['symbol_count'] = sc
+        self.attrs['element_count'] = ec
+
+        self._index = [None for _ in range(sc + 1)]
+        self._state = {}
+        self._alias = {}
+
+        return [self._load_symbol(s_num) for s_num in range(sc + 1)]
+
+    def refresh(self):
+        """Reload Symbols which have changed since the file was read.
+
+        The file is reopened, e.g. after it was rewritten by a running GAMS
+        job. For each Symbol which was already read, its metadata (type,
+        dimension, domain and number of records) and a fingerprint of its
+        records are compared to those cached. Only changed Symbols, and those
+        indexed by changed Sets, are reloaded; others, and their coordinates,
+        are kept as they are. Symbols which were not yet read remain lazy.
+
+        Returns the set of names of changed Symbols.
+        """
+        keys = ('type_code', 'dim', 'domain', 'records')
+
+        # Metadata of the Symbols read so far
+        previous = {}
+        for name, state in self._state.items():
+            if state is not None and name not in self._alias:
+                previous[name] = self._symbol_attrs(name)
+        loaded = set(name for name in previous if self._state[name] is True)
+        aliases = set(self._alias)
+        records = self._records
+
+        # Reopen the file and read the new table of Symbols
+        self.close()
+        self._open()
+        self._records = {}
+        new = self._read_symbol_table()
+
+        # Symbols which have been removed
+        changed = set(previous) - set(self._state)
+        for name, state in self._state.items():
+            if name not in previous or not isinstance(state, dict):
+                continue  # New Symbol, Alias or Equation
+            attrs = state['attrs']
+            if any(previous[name][k] != attrs[k] for k in keys):
+                changed.add(name)
+            elif 'fingerprint' in previous[name] or name in records:
+                # Compare the fingerprint of the records
+                fingerprint = previous[name].get('fingerprint') or \
+                    records[name]['fingerprint']
+                if name in loaded:
+                    # Read without holding the records in memory
+                    current = self._read_fingerprint(name)
+                else:
+                    current = self._load_records(name)['fingerprint']
+                if current != fingerprint:
+                    changed.add(name)
+                elif name in records:
+                    self._records[name] = records[name]
+
+        if '*' in changed:
+            # Positions in '*' of the labels in every coordinate have changed
+            changed |= loaded
+            self._interned = {}
+            self._members = {}
+        for name in loaded - changed:
+            # Symbols indexed by changed Sets
+            if changed & set(self._variables[name].dims):
+                changed.add(name)
+
+        # Remove changed Symbols, and the coordinates that depend on them
+        drop = [name for name in self._variables if name in changed or
+                (name.startswith('_star_') and '*' in changed)]
+        drop += ['_{}_text'.format(name) for name in changed]
+        drop += [name for name in aliases if self._alias.get(name) in changed]
+        for name in changed:
+            # The dimension of records of a 'long' Symbol, and the levels of
+            # its MultiIndex
+            record_dim = '_{}_record'.format(name)
+            if record_dim in self._variables:
+                drop.append(record_dim)
+                drop.extend(self._variables[record_dim].to_index().names)
+        drop = set(drop) & set(self._variables)
+        self._drop(drop)
+        for name in drop:
+            self._members.pop(name, None)
+            self._specials.pop(name, None)
+
+        for name in loaded - changed:
+            # Keep unchanged Symbols, updating the index
+            self._variables[name].attrs['_gdx_index'] = \
+                self._state[name]['attrs']['index']
+            self._state[name] = True
+        for name, type_code in new:
+            if (name in changed & loaded or (name not in previous and
+                                             type_code == gdxcc.GMS_DT_SET)):
+                # Reload changed Symbols that were loaded, and new Sets
+                self._load_symbol_data(name)
+            elif name in self._alias and self._alias[name] in self._variables:
+                self._add_alias(name)
+
+        return changed
+
+    def _drop(self, names):
+        """Remove the variables *names* from the :class:`File`, in place.
+
+        Unlike ``del``, this also discards the sizes of dimensions no longer
+        used, and removes a :py:class:`pandas.MultiIndex` together with its
+        levels.
+        """
+        drop = (getattr(super(File, self), 'drop_vars', None) or
+                super(File, self).drop)
+        ds = drop(list(names))
+        for k in ('_variables', '_coord_names', '_dims', '_indexes'):
+            if hasattr(ds, k):  # No _indexes in older xarray
+                setattr(self, k, getattr(ds, k))
+
+    def _open(self):
+        """Acquire a GDX handle from the pool and open the file for reading.
+
+        Does nothing if the file is already open.
+        """
+        if self._api is not None:
+            return
+        api = pool.acquire()
+        try:
+            api.open_read(self._filename)
+        except Exception:
+            pool.release(api)
+            raise
+        self._api = api
+        # Return the handle to the pool if the File is discarded while open
+        self._release = finalize(self, pool.release, api)
+
+    def close(self):
+        """Close the GDX file, returning its handle to :data:`gdx.api.pool`.
+
+        Symbols already loaded remain available. Lazy-loading another Symbol
+        reopens the file. A :class:`File` that is not closed returns its handle
+        when it is garbage-collected.
+        """
+        if self._api is not None:
+            self._release()
+            self._api = None
+        super(File, self).close()
+
+    def _load_symbol(self, index):
+        """Load the *index*-th Symbol in the GDX file."""
+        # Load basic information
+        name, dim, type_code = self._api.symbol_info(index)
+        n_records, vartype, desc = self._api.symbol_info_x(index)
+
+        self._index[index] = name  # Record the name
+
+        attrs = {
+            'index': index,
+            'name': name,
+            'dim': dim,
+            'type_code': type_code,
+            'records': n_records,
+            'vartype': vartype,
+            'description': desc,
+            }
+
+        # Assemble a string description of the Symbol's type
+        type_str_ = type_str[type_code]
+        if type_code == gdxcc.GMS_DT_PAR and dim == 0:
+            type_str_ = 'scalar'
+        try:
+            vartype_str_ = vartype_str[vartype]
+        except KeyError:  # pragma: no cover
+            # Some other vartype is returned that's not described by the GDX
+            # API docs
+            vartype_str_ = ''
+        attrs['type_str'] = '{} {}'.format(vartype_str_, type_str_)
+
+        debug(str('Loading #{index} {name}: {dim}-D, {records} records, '
+                  u'"{description}"').format(**attrs))
+
+        # Equations and Aliases require limited processing
+        if type_code == gdxcc.GMS_DT_EQU:
+            info('Loading of GMS_DT_EQU not implemented: {} {} not loaded.'.
+                 format(index, name))
+            self._state[name] = None
+            return name, type_code
+        elif type_code == gdxcc.GMS_DT_ALIAS:
+            parent = desc.replace('Aliased with ', '')
+            self._alias[name] = parent
+            self._state[name] = {'attrs': attrs}
+            if parent in self._variables:
+                self._add_alias(name)
+            # Otherwise, added when the parent Set is loaded
+            return name, type_code
+
+        # The Symbol is either a Set, Parameter or Variable
+        try:  # Read the domain, as a list of names
+            domain = self._api.symbol_get_domain_x(index)
+            debug('domain: {}'.format(domain))
+        except Exception:  # gdxSymbolGetDomainX fails for the universal set
+            assert name == '*'
+            domain = []
+
+        # Cache the attributes
+        attrs['domain'] = domain
+        self._state[name] = {'attrs': attrs}
+
+        return name, type_code
+
+    def _add_alias(self, name):
+        """Add the Alias *name*, loading its parent Set if necessary."""
+        parent = self[self._alias[name]]
+        assert parent.attrs['_gdx_type_code'] == gdxcc.GMS_DT_SET
+        # Duplicate the variable
+        self._variables[name] = self._variables[parent.name]
+        self._state[name] = True
+        super(File, self).set_coords(name, inplace=True)
+
+    def _dependencies(self, names):
+        """Return the names of the Sets that the Symbols *names* depend on.
+
+        These are the Sets in the domains of *names*, the Sets in their
+        domains, etc., and the parent Sets of Aliases.
+        """
+        result = set()
+        todo = list(names)
+        while len(todo):
+            name = todo.pop()
+            if name in self._alias:
+                depends = [self._alias[name]]
+            elif self._state.get(name) is not None:
+                depends = self._symbol_attrs(name)['domain']
+            else:  # Equations, or not a Symbol
+                continue
+            for d in set(depends) - result:
+                result.add(d)
+                todo.append(d)
+        return result
+
+    def _load_symbol_data(self, name):
+        """Load the Symbol *name*."""
+        if self._state[name] in (True, None):  # Skip Symbols already loaded
+            return
+        elif name in self._alias:
+            self._add_alias(name)
+            return
+
+        # Unpack attributes
+        attrs = self._state[name]['attrs']
+        index, dim, domain = [attrs[k] for k in ('index', 'dim', 'domain')]
+
+        # If the GAMS method 'sameas' is invoked in a program, the resulting
+        # GDX file contains an empty Set named 'SameAs' with domain (*,*). Do
+        # not read this
+        if name == 'SameAs' and domain == ['*', '*']:
+            self._state[name] = None
+            self._index[index] = None
+            return
+
+        if self._mmap and self._stream_symbol(name):
+            return  # Stored in a numpy.memmap
+
+        # Read the data
+        self._load_records(name)
+
+        domain = self._infer_domain(name, domain,
+                                    self._records[name]['elements'])
+
+        # Create an xr.DataArray with the Symbol's data
+        self._add_symbol(name, dim, domain, attrs)
+
+        # Discard the records; they are read again if needed
+        del self._records[name]
+
+    def _symbol_attrs(self, name):
+        """Return the attributes of Symbol *name*, whether loaded or not."""
+        if isinstance(self._state[name], dict):
+            return self._state[name]['attrs']
+        return {k[len('_gdx_'):]: v for k, v in
+                self._variables[name].attrs.items() if k.startswith('_gdx_')}
+
+    def _load_records(self, name):
+        """Read the records of Symbol *name*, if they are not yet cached.
+
+        The Symbol is not added to the :class:`File`. The records are cached
+        only until the Symbol is loaded; the records of a loaded Symbol are
+        read again on each call.
+        """
+        if name not in self._records:
+            attrs = self._symbol_attrs(name)
+            self._open()
+            self._cache_data(name, attrs['index'], attrs['dim'],
+                             attrs['records'])
+            if self._state[name] is True:
+                return self._records.pop(name)
+        return self._records[name]
+
+    def _read_elements(self, name):
+        """Return the distinct labels along each dimension of Symbol *name*.
+
+        The records are read from the GDX file, but not kept.
+        """
+        elements = [list() for _ in range(self._symbol_attrs(name)['dim'])]
+        for elements, _, _, _ in self._read_batches(name):
+            pass
+        return elements
+
+    def _read_batches(self, name):
+        """Read the records of Symbol *name* in batches of :data:`_mmap_batch`.
+
+        Yields, for each batch, the lists of distinct *elements* read so far,
+        which grow from batch to batch; the *codes* of the records in the
+        batch, as for :meth:`_cache_data`; an array of values, in which GAMS
+        special values are replaced; and the *special* positions and kinds of
+        these, or :obj:`None`.
+        """
+        attrs = self._symbol_attrs(name)
+        dim = attrs['dim']
+        elements = [list() for _ in range(dim)]
+        positions = [dict() for _ in range(dim)]
+        self._open()
+        self._api.data_read_str_start(attrs['index'])
+        try:
+            for start in range(0, attrs['records'], _mmap_batch):
+                n = min(_mmap_batch, attrs['records'] - start)
+                codes = numpy.empty((n, dim), dtype=numpy.intp)
+                values = numpy.empty(n)
+                for i in range(n):
+                    labels, value, _ = self._api.data_read_str()
+                    for j, label in enumerate(labels):
+                        try:
+                            codes[i, j] = positions[j][label]
+                        except KeyError:  # First appearance of label
+                            codes[i, j] = positions[j][label] = \
+                                len(elements[j])
+                            elements[j].append(label)
+                    values[i] = value[gdxcc.GMS_VAL_LEVEL]
+                special = _map_special(values, self._special)
+                yield elements, codes, values, special
+        finally:
+            self._api.data_read_done()
+
+    def _read_fingerprint(self, name):
+        """Return the fingerprint of the records of Symbol *name*.
+
+        The records are read in batches, and not kept.
+        """
+        fingerprint = _Fingerprint()
+        elements = [list() for _ in range(self._symbol_attrs(name)['dim'])]
+        for elements, codes, values, _ in self._read_batches(name):
+            fingerprint.update(codes, values)
+        return fingerprint.hexdigest(elements)
+
+    def _stream_symbol(self, name):
+        """Load Symbol *name* into a numpy.memmap, if it has layout 'mmap'.
+
+        The records are read from the GDX file in batches of
+        :data:`_mmap_batch`, and each batch is scattered into the memmap, so
+        the memory used does not depend on the number of records or the size
+        of the array. Returns :obj:`False` if the Symbol has another layout.
+        """
+        attrs = self._state[name]['attrs']
+        dim, domain = attrs['dim'], attrs['domain']
+        is_set = attrs['type_code'] == gdxcc.GMS_DT_SET
+        if dim == 0 or (is_set and dim == 1):
+            return False
+        dtype = numpy.dtype(bool if is_set else float)
+
+        if '*' in domain:
+            size = dtype.itemsize
+            for d in domain:
+                size *= len(self[d])
+            if size <= self._max_bytes:
+                return False  # Dense over the declared domain, or smaller
+            # Infer the domain from a first pass over the labels only
+            domain = self._infer_domain(name, domain,
+                                        self._read_elements(name))
+
+        layout, nbytes = self._plan(name, domain, dtype, attrs['records'])
+        if layout != 'mmap':
+            return False
+
+        gdx_attrs = {'_gdx_{}'.format(k): v for k, v in attrs.items()}
+        gdx_attrs['_gdx_layout'] = layout
+        gdx_attrs['_gdx_dense_nbytes'] = nbytes
+        data, path = self._memmap(name, *domain, dtype=dtype,
+                                  fill_value=False if is_set else numpy.nan)
+        if path is not None:
+            gdx_attrs['_gdx_mmap_file'] = path
+
+        indexes = [self[d].to_index() for d in domain]
+        # Positions in *indexes* of the elements read so far
+        found = [numpy.empty(0, dtype=numpy.intp) for _ in domain]
+        fingerprint = _Fingerprint()
+        elements = [list() for _ in domain]
+        specials = []
+        for elements, codes, values, special in self._read_batches(name):
+            fingerprint.update(codes, values)
+            if special is not None:
+                specials.append(self._special_labels(elements, codes,
+                                                     special))
+            for j, index in enumerate(indexes):
+                found[j] = numpy.concatenate([found[j], index.get_indexer(
+                    elements[j][len(found[j]):])])
+            data[tuple(found[j][codes[:, j]] for j in range(dim))] = \
+                True if is_set else values
+        data.flush()
+        gdx_attrs['_gdx_fingerprint'] = fingerprint.hexdigest(elements)
+        if len(specials):
+            self._specials[name] = tuple(numpy.concatenate(a) for a in
+                                         zip(*specials))
+
+        self._state[name] = True
+        dims = [self._root_dim(d) for d in domain]
+        setitem = (self.coords.__setitem__ if is_set else
+                   super(File, self).__setitem__)
+        setitem(name, (dims, data, gdx_attrs))
+        return True
+
+    def _cache_data(self, name, index, dim, records):
+        """Read data for the Symbol *name* from the GDX file.
+
+        The records are cached in :attr:`_records` as integer codes: for each
+        dimension, a list of the distinct *elements* appearing in the data, in
+        order of first appearance; and a (*records* × *dim*) array of *codes*,
+        the positions of each record's labels within *elements*. GAMS special
+        values are replaced; if there are any, their *special* positions and
+        kinds are also cached.
+        """
+        # Initiate the data read. The API method returns a number of records,
+        # which should match that given by gdxSymbolInfoX in _load_symbol()
+        records2 = self._api.data_read_str_start(index)
+        assert records == records2, \
+            ('{}: gdxSymbolInfoX ({}) and gdxDataReadStrStart ({}) disagree on'
+             ' number of records.').format(name, records, records2)
+
+        # Labels appearing in the data, one list per dimension, and the
+        # position of each label within its list
+        elements = [list() for _ in range(dim)]
+        positions = [dict() for _ in range(dim)]
+        # Codes of data records, and data points. For a 1-D Set, the data is
+        # the GDX 'string number' of the text associated with the element
+        codes = []
+        values = []
+        for _ in range(records):  # Loop over all records
+            labels, value, _ = self._api.data_read_str()  # Next record
+            code = []
+            for j, label in enumerate(labels):
+                try:
+                    code.append(positions[j][label])
+                except KeyError:  # First appearance of label in dimension j
+                    positions[j][label] = len(elements[j])
+                    code.append(len(elements[j]))
+                    elements[j].append(label)
+            codes.append(code)
+            # The value is a sequence, containing the level, marginal,
+            # lower & upper bounds, etc. Store only the value (first
+            # element).
+            values.append(value[gdxcc.GMS_VAL_LEVEL])
+        self._api.data_read_done()
+
+        codes = numpy.array(codes, dtype=numpy.intp).reshape(records, dim)
+        values = numpy.array(values, dtype=float)
+        special = _map_special(values, self._special)
+
+        # Fingerprint of the records
+        fingerprint = _Fingerprint()
+        fingerprint.update(codes, values)
+
+        # Cache the read data
+        self._records[name] = {
+            'elements': elements,
+            'codes': codes,
+            'values': values,
+            'fingerprint': fingerprint.hexdigest(elements),
+            }
+        if special is not None:
+            self._records[name]['special'] = special
+
+    def _infer_domain(self, name, domain, elements):
+        """Infer the domain of the Symbol *name*.
+
+        Lazy GAMS modellers may create variables like myvar(*,*,*,*). If the
+        size of the universal set * is large, then attempting to instantiate a
+        xr.DataArray with this many elements may cause a MemoryError. For every
+        dimension of *name* defined on the domain '*' this method tries to find
+        a Set from the file which contains all the labels appearing in *name*'s
+        data.
+
+        """
+        if '*' not in domain:
+            return domain
+        debug('guessing a better domain for {}: {}'.format(name, domain))
+
+        # Domain as a list of references to Variables in the File/xr.Dataset
+        domain_ = [self[d] for d in domain]
+
+        for i, d in enumerate(domain_):  # Iterate over dimensions
+            if d.name != '*' or len(elements[i]) == 0:  # pragma: no cover
+                assert (d.to_index().get_indexer(elements[i]) >= 0).all()
+                continue  # The stated domain matches the data; or no data
+            # '*' is given
+            if (self._state[name]['attrs']['type_code'] == gdxcc.GMS_DT_PAR and
+                    self._implicit):
+                used = [d_.name for d_ in domain_[:i]]
+                d = self[self._implicit_set(name, i, elements[i], used)]
+            else:
+                # try to find a smaller domain for this dimension
+                # Iterate over every 1-D Set, comparing positions in '*'
+                codes = d.to_index().get_indexer(elements[i])
+                for s, members in list(self._members.items()):
+                    if len(members) < len(d) and \
+                            numpy.isin(codes, members).all():
+                        d = self[s]  # Found a smaller Set; use this instead
+            domain_[i] = d
+
+        # Convert the references to names
+        inferred = [d.name for d in domain_]
+
+        if domain != inferred:
+            # Store the result
+            self._state[name]['attrs']['domain_inferred'] = inferred
+            debug('…inferred {}.'.format(inferred))
+        else:
+            debug('…failed.')
+
+        return inferred
+
+    def _intern(self, codes):
+        """Return a coordinate for the labels at positions *codes* in '*'.
+
+        Returns a content hash of *codes*, and a :py:class:`pandas.Index` of
+        labels. The same Index is returned for identical *codes*, so that
+        identical coordinates in the :class:`File` share memory.
+        """
+        codes = numpy.asarray(codes, dtype=numpy.int64)
+        key = hashlib.sha1(codes.tobytes()).hexdigest()
+        if key not in self._interned:
+            self._interned[key] = self['*'].to_index()[codes].rename(None)
+        return key, self._interned[key]
+
+    def _implicit_set(self, name, i, labels, used):
+        """Return the name of an implicit set containing *labels*.
+
+        The labels are ordered as in '*', and the set is named for the hash of
+        its contents, so that it is shared with other Parameters. *used* are
+        names already used for other dimensions of *name*.
+        """
+        codes = numpy.sort(self['*'].to_index().get_indexer(labels))
+        key, index = self._intern(codes)
+
+        # Avoid hash prefix collisions, and repeated dimensions of *name*
+        d = '_star_{}'.format(key[:8])
+        n = 0
+        while d in used or (d in self.coords and
+                            self[d].attrs['_gdx_hash'] != key):
+            n += 1
+            d = '_star_{}_{}'.format(key[:8], n)
+
+        if d not in self.coords:
+            debug(('Constructing implicit set {} for dimension {} of {}\n'
+                   ' {} instead of {} elements')
+                  .format(d, i, name, len(labels), len(self['*'])))
+            self.coords[d] = (d, index)
+            self.coords[d].attrs['_gdx_hash'] = key
+            self._members[d] = codes
+
+        return d
+
+    def _root_dim(self, dim):
+        """Return the ultimate ancestor of the 1-D Set *dim*."""
+        parent = self[dim].dims[0]
+        return dim if parent == dim else self._root_dim(parent)
+
+    def _mask(self, name, parent):
+        """Return a boolean mask of the elements of *parent* in Set *name*.
+
+        Both are 1-D Sets. Membership is compared using the positions of their
+        elements in '*', the ultimate ancestor of every Set.
+        """
+        members = [self._members[self._alias.get(n, n)] for n in
+                   (name, parent)]
+        return numpy.isin(members[1], members[0])
+
+    def _empty(self, *dims, **kwargs):
+        """Return an empty numpy.ndarray for a GAMS Set or Parameter."""
+        size = []
+        dtypes = []
+        for d in dims:
+            size.append(len(self[d]))
+            dtypes.append(self[d].dtype)
+        dtype = kwargs.pop('dtype', numpy.result_type(*dtypes))
+        fv = kwargs.pop('fill_value')
+        return numpy.full(size, fill_value=fv, dtype=dtype)
+
+    def _positions(self, records, indexes, select=slice(None)):
+        """Return the positions of *records* in *indexes*.
+
+        *records* are those of a Symbol, as read by :meth:`_load_records`.
+        *indexes* contains one :py:class:`pandas.Index` per dimension of the
+        Symbol. The result is a tuple of integer arrays, suitable for indexing
+        a :py:class:`numpy.ndarray` with the same dimensions. If *select* is
+        given, only the positions of those records are returned.
+        """
+        result = []
+        for i, index in enumerate(indexes):
+            # Position of each distinct element, then of each record
+            pos = index.get_indexer(records['elements'][i])
+            result.append(pos[records['codes'][select, i]])
+        return tuple(result)
+
+    def _record_index(self, records, names):
+        """Return a :py:class:`pandas.MultiIndex` of the labels of *records*.
+
+        The index has one level per dimension, with the given *names*.
+        """
+        return pandas.MultiIndex(
+            levels=[pandas.Index(e) for e in records['elements']],
+            codes=records['codes'].T, names=names)
+
+    def _memmap(self, name, *dims, **kwargs):
+        """Return an empty numpy.memmap for the Symbol *name*.
+
+        The memmap is filled in blocks, so that its contents need not be in
+        memory at once. See :meth:`_empty`. If *fill_value* is not given, it
+        is not filled; if *shape* is given, it is used instead of the lengths
+        of *dims*. Returns the memmap, and the path of its file, or
+        :obj:`None` for a temporary file.
+        """
+        shape = kwargs.pop('shape', None) or tuple(len(self[d]) for d in dims)
+        dtype = kwargs.pop('dtype')
+        if self._mmap is True:
+            path = None
+            with tempfile.TemporaryFile() as f:
+                data = numpy.memmap(f, dtype=dtype, mode='w+', shape=shape)
+        else:
+            # A new file, so that other Files using the same directory, or
+            # arrays mapping earlier files, are not affected
+            fd, path = tempfile.mkstemp(suffix='.npy', dir=str(self._mmap),
+                                        prefix='{}-'.format(name))
+            os.close(fd)
+            data = numpy.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                                shape=shape)
+
+        if 'fill_value' in kwargs:
+            step = max(1, _mmap_batch // (int(numpy.prod(shape[1:])) or 1))
+            for start in range(0, shape[0], step):
+                data[start:start + step] = kwargs['fill_value']
+        return data, path
+
+    def _add_symbol(self, name, dim, domain, attrs):
+        """Add a xray.DataArray with the data from Symbol *name*."""
+        # Transform the attrs for storage, unpack data
+        gdx_attrs = {'_gdx_{}'.format(k): v for k, v in attrs.items()}
+        elements = self._records[name]['elements']
+        values = self._records[name]['values']
+        fingerprint = self._records[name]['fingerprint']
+        gdx_attrs['_gdx_fingerprint'] = fingerprint
+        if 'special' in self._records[name]:
+            # Keep the records with special values; the others are discarded
+            self._specials[name] = self._special_labels(
+                elements, self._records[name]['codes'],
+                self._records[name]['special'])
+
+        # Mark the Symbol as loaded; this prevents __getitem__ from triggering
+        # lazy-loading, which is still in progress
+        self._state[name] = True
+
+        kwargs = {}  # Arguments to xr.Dataset.__setitem__()
+        if dim == 0:
+            # 0-D Variable or scalar Parameter
+            super(File, self).__setitem__(name, ([], values[0], gdx_attrs))
+            return
+        elif attrs['type_code'] == gdxcc.GMS_DT_SET and dim == 1:
+            # One-dimensional Set
+            if name == '*':
+                index = pandas.Index(elements[0])
+                codes = numpy.arange(len(index))
+            else:
+                codes = self['*'].to_index().get_indexer(elements[0])
+                key, index = self._intern(codes)
+            if self._dedupe:
+                # Use an identical Index from another File
+                index = _store.setdefault(('index', fingerprint), index)
+                # xarray wraps the Index; keep a reference, so that the entry
+                # in the store lives as long as this File
+                self._interned['*' if name == '*' else key] = index
+            self.coords[name] = (name, index)
+            self.coords[name].attrs = gdx_attrs
+            # Membership, as positions in '*'
+            self._members[name] = codes
+            # Aliases of the Set
+            for alias in [a for a, p in self._alias.items() if p == name]:
+                self._add_alias(alias)
+            return
+        elif attrs['type_code'] == gdxcc.GMS_DT_SET:
+            # Multi-dimensional Sets are mappings indexed by other Sets;
+            # elements are either 'on'/True or 'off'/False
+            kwargs['dtype'] = bool
+            kwargs['fill_value'] = False
+            values = True
+            setitem = self.coords.__setitem__
+        else:  # 1+-dimensional GAMS Parameters
+            kwargs['dtype'] = float
+            kwargs['fill_value'] = numpy.nan
+            setitem = super(File, self).__setitem__
+
+        # Don't define over the actual domain dimensions, but over the parent
+        # Set/xr.Coordinates for each dimension
+        dims = [self._root_dim(d) for d in domain]
+
+        # Choose the storage layout before allocating any memory
+        layout, nbytes = self._plan(name, domain, kwargs['dtype'],
+                                    attrs['records'])
+        gdx_attrs['_gdx_layout'] = layout
+        gdx_attrs['_gdx_dense_nbytes'] = nbytes
+
+        if layout == 'long':
+            # A 1-D array along a dimension of records, indexed by a
+            # pandas.MultiIndex built from the cached codes
+            records = self._records[name]
+            record_dim = '_{}_record'.format(name)
+            index = self._record_index(records, [
+                '_{}_{}'.format(name, c) for c in _column_names(domain)])
+            data = numpy.full(len(records['values']), values,
+                              dtype=kwargs['dtype'])
+            setitem(name, xr.DataArray(data, coords={record_dim: index},
+                                       dims=[record_dim], attrs=gdx_attrs))
+            return
+
+        if layout == 'sparse':
+            import sparse
+            positions = self._positions(self._records[name],
+                                        [self[d].to_index() for d in domain])
+            data = sparse.COO(numpy.array(positions).reshape(dim, -1),
+                              numpy.broadcast_to(values, len(positions[0])),
+                              shape=[len(self[d]) for d in domain],
+                              fill_value=kwargs['fill_value'])
+        else:
+            key = (self._store_key(name, domain, attrs['type_code'],
+                                   kwargs['dtype']) if self._dedupe else None)
+            data = None if key is None else _store.get(key)
+            if data is None:
+                # Scatter the records directly into an empty array of the
+                # proper form
+                data = self._empty(*domain, **kwargs)
+                data[self._positions(self._records[name],
+                                     [self[d].to_index() for d in
+                                      domain])] = values
+                if key is not None:
+                    data.flags.writeable = False
+                    _store[key] = data
+
+        setitem(name, (dims, data, gdx_attrs))
+
+    def _store_key(self, name, domain, type_code, dtype):
+        """Return a key for the dense data of Symbol *name* over *domain*.
+
+        The key combines the *type_code* of *name*, the *dtype* of the data,
+        and the fingerprint of the records of *name* with those of the
+        coordinates for each dimension, so that it is the same for identical
+        data in any :class:`File`, and differs between e.g. a Set and a
+        Parameter with the same records.
+        """
+        key = [type_code, numpy.dtype(dtype).str,
+               self._records[name]['fingerprint']]
+        for d in domain:
+            attrs = self[d].attrs
+            try:
+                key.append(attrs['_gdx_fingerprint'])
+            except KeyError:
+                # An implicit set; identified by its positions in '*'
+                key.append(self['*'].attrs['_gdx_fingerprint'] +
+                           attrs['_gdx_hash'])
+        return ('data',) + tuple(key)
+
+    def _plan(self, name, domain, dtype, records):
+        """Choose a storage layout for the Symbol *name* over *domain*.
+
+        *records* is the number of records of *name*. Returns the layout and
+        the size in bytes of a dense array with *dtype*.
+        The layout is 'dense' if this size is no more than the *max_bytes*
+        given to the :class:`File`, and the density (the fraction of the array
+        filled by records) is at least *density*. A dense array larger than
+        *max_bytes* is 'mmap' if the :class:`File` has *mmap*. Otherwise the
+        layout is 'sparse' if the :py:mod:`sparse` package is available, or
+        'long'.
+        """
+        size = 1
+        for d in domain:
+            size *= len(self[d])
+        nbytes = size * numpy.dtype(dtype).itemsize
+        density = records / size if size else 1.
+
+        if nbytes <= self._max_bytes and density >= self._density:
+            layout = 'dense'
+        elif self._mmap and nbytes and density >= self._density:
+            layout = 'mmap'
+        else:
+            try:
+                import sparse  # noqa: F401
+                layout = 'sparse'
+            except ImportError:
+                layout = 'long'
+        if layout != 'dense':
+            info('Loading {} as {}: {} bytes with density {:.3g} if dense'
+                 .format(name, layout, nbytes, density))
+        return layout, nbytes
+
+    def dealias(self, name):
+        """Identify the GDX Symbol that *name* refers to, and return the
+        corresponding :py:class:`xarray.DataArray`."""
+        return self[self._alias[name]] if name in self._alias else self[name]
+
+    def extract(self, name, copy=True):
+        """Extract the GAMS Symbol *name* from the dataset.
+
+        The Sets and Parameters in the :class:`File` can be accessed directly,
+        as e.g. `f['name']`; but for more complex xarray operations, such as
+        concatenation and merging, this carries along sub-Sets and other
+        Coordinates which confound xarray.
+
+        :func:`extract()` returns a self-contained :py:class:`xarray.DataArray`
+        with the declared dimensions of the Symbol (and *only* those
+        dimensions), which does not make reference to the :class:`File`. The
+        data is taken from the array stored in the :class:`File`, without
+        reading the GDX file again; only the (possibly much smaller) result is
+        allocated.
+
+        If *copy* is ``False`` and no dimension needs to be reduced, the data
+        of the result is a view on the array stored in the :class:`File`.
+        Otherwise, Symbols stored with the 'mmap' layout are copied in blocks
+        into a new :py:class:`numpy.memmap`, so that the result may also be
+        larger than memory.
+
+        Symbols stored with the 'sparse' or 'long' layout (see :class:`File`)
+        are extracted in the same layout, so that no dense array is allocated.
+        A 'long' result has one level of its :py:class:`pandas.MultiIndex`
+        for each declared dimension.
+        """
+        # Trigger lazy-loading if needed
+        da = self[name]
+
+        if da.ndim == 0 or name in self.dims or name in self._alias:
+            # Scalars and 1-D Sets are already self-contained
+            return da.copy(deep=copy)
+
+        # Declared dimensions of the Symbol, and their parents
+        try:
+            domain = da.attrs['_gdx_domain_inferred']
+        except KeyError:  # No domain was inferred for this Symbol
+            domain = da.attrs['_gdx_domain']
+
+        layout = da.attrs.get('_gdx_layout', 'dense')
+        data = da.data
+        attrs = dict(da.attrs)
+
+        if layout == 'long':
+            # Records appear only along the declared dimensions; rename the
+            # levels of the MultiIndex
+            record_dim = '_{}_record'.format(name)
+            index = da.indexes[record_dim].rename(_column_names(domain))
+            return xr.DataArray(data.copy() if copy else data,
+                                coords={record_dim: index},
+                                dims=[record_dim], name=name, attrs=attrs)
+
+        # Positions to keep along each dimension of the stored data, or None
+        # to keep all
+        keep = []
+        for i, c in enumerate(domain):
+            p = self._root_dim(c)
+            if c == '*':
+                # Dimension is '*'; keep only labels appearing in the data, in
+                # their original order
+                if layout == 'sparse':
+                    keep.append(numpy.unique(data.coords[i]))
+                else:
+                    keep.append(_occupied(data, i))
+            elif c != p:
+                # Dimension is indexed by 'p', but declared 'c'. Keep only the
+                # elements which appear in the sub-Set c
+                keep.append(numpy.flatnonzero(self._mask(c, p)))
+            else:
+                keep.append(None)
+
+        # Labels along each declared dimension
+        indexes = []
+        for c, k in zip(domain, keep):
+            index = self[self._root_dim(c)].to_index()
+            indexes.append((index if k is None else index[k]).rename(c))
+
+        reduced = any(k is not None for k in keep)
+        shape = tuple(n if k is None else len(k) for k, n in
+                      zip(keep, data.shape))
+        if layout == 'mmap' and (copy or reduced) and all(shape):
+            # Copy the positions kept, in blocks, into a new memmap. An empty
+            # file cannot be mapped; empty results are built in memory below.
+            index = [numpy.arange(n) if k is None else k for k, n in
+                     zip(keep, data.shape)]
+            result, path = self._memmap(name, shape=shape, dtype=data.dtype)
+            step = max(1, _mmap_batch //
+                       (int(numpy.prod(result.shape[1:])) or 1))
+            for start in range(0, result.shape[0], step):
+                result[start:start + step] = data[numpy.ix_(
+                    index[0][start:start + step], *index[1:])]
+            result.flush()
+            data = result
+            attrs.pop('_gdx_mmap_file', None)
+            if path is not None:
+                attrs['_gdx_mmap_file'] = path
+        elif not reduced:
+            # No reduction; use the existing data, or a copy
+            if copy:
+                data = data.copy() if layout == 'sparse' else numpy.array(data)
+        elif layout == 'sparse':
+            data = _reduce_coo(data, keep)
+        else:
+            data = data[numpy.ix_(*[numpy.arange(n) if k is None else k for
+                                    k, n in zip(keep, data.shape)])]
+
+        return xr.DataArray(data, coords=list(zip(domain, indexes)),
+                            name=name, attrs=attrs)
+
+    def share(self, name=None):
+        """Publish the loaded Symbols to shared memory, named *name*.
+
+        Other processes can attach to the data using :func:`gdx.shm.attach`.
+        See :func:`gdx.shm.publish`.
+        """
+        from .shm import publish
+        return publish(self, name)
+
+    def info(self, name):
+        """Informal string representation of the Symbol with *name*."""
+        if isinstance(self._state[name], dict):
+            attrs = self._state[name]['attrs']
+            # An Alias that is not loaded has the domain of its parent Set
+            domain = [self._alias[name]] if name in self._alias else \
+                attrs['domain']
+            return '{} {}({}), {} records: {}'.format(
+                attrs['type_str'], name, ','.join(domain), attrs['records'],
+                attrs['description'])
+        else:
+            return repr(self[name])
+
+    def _loaded_and_cached(self, type_code):
+        """Return a list of loaded and not-loaded Symbols of *type_code*."""
+        names = set()
+        for name, state in self._state.items():
+            if state is True:
+                tc = self._variables[name].attrs['_gdx_type_code']
+            elif name in self._alias:
+                tc = gdxcc.GMS_DT_SET
+            elif isinstance(state, dict):
+                tc = state['attrs']['type_code']
+            else:  # pragma: no cover
+                continue
+            if tc == type_code:
+                names.add(name)
+        return names
+
+    def records(self, name):
+        """Return the records of Symbol *name* as a
+        :py:class:`pandas.DataFrame`.
+
+        Equivalent to :meth:`query` with no arguments.
+        """
+        return self.query(name)
+
+    def query(self, name, where=None, within=(), by=None, agg='sum'):
+        """Query the records of the Set or Parameter *name*.
+
+        The result is a long :py:class:`pandas.DataFrame`, with one categorical
+        column for each dimension of *name*, named for its declared domain,
+        and a column 'value'. Sets have no 'value' column. The query is
+        evaluated on integer codes for the labels in each record, without
+        loading *name* or any other Symbol as a :py:class:`xarray.DataArray`,
+        so its cost is proportional to the number of records.
+
+        *where* is an expression comparing the 'value' of each record, e.g.
+        ``'value > 0'``; see :py:meth:`pandas.DataFrame.eval`.
+
+        *within* is a list of Sets. Only records appearing in every Set are
+        kept, matching the dimensions of each Set to the columns with the same
+        names. *within* may also be a dict mapping Set names to lists of
+        columns.
+
+        If *by* (a column name or list of names) is given, records are grouped
+        by these columns and 'value' is aggregated using *agg*, e.g. 'sum',
+        'mean', 'max'. For Sets, 'value' is the number of records in each
+        group.
+
+        >>> f.query('p3', where='value > 0', within=['s3'], by='s')
+        """
+        table = self._query_table(name)
+
+        if where is not None:
+            table = table[table.eval(where)]
+
+        if not isinstance(within, dict):
+            within = {s: None for s in within}
+        for s, columns in within.items():
+            other = self._query_table(s)
+            if columns is None:
+                columns = [c for c in other.columns if c in table.columns]
+            if len(columns) != len(other.columns):
+                raise ValueError("can't match dimensions {} of {} to {}"
+                                 .format(list(other.columns), s,
+                                         list(table.columns)))
+            other.columns = columns
+            table = table.merge(other, on=columns, how='inner', sort=False)
+
+        if by is not None:
+            grouped = table.groupby(by, sort=False)
+            if 'value' in table:
+                table = grouped['value'].agg(agg).reset_index()
+            else:
+                table = grouped.size().rename('value').reset_index()
+
+        # Convert codes to labels
+        star = self['*'].to_index()
+        for c in table.columns:
+            if c != 'value':
+                table[c] = pandas.Categorical.from_codes(table[c],
+                                                         categories=star)
+        return table.reset_index(drop=True)
+
+    def _query_table(self, name):
+        """Return the records of *name* for :meth:`query`.
+
+        Labels are given as integer positions in '*', so that tables for
+        different Symbols can be compared and joined directly.
+        """
+        name = self._alias.get(name, name)
+        records = self._load_records(name)
+        attrs = self._symbol_attrs(name)
+
+        columns = _column_names(attrs['domain'])
+        star = self['*'].to_index()
+        table = pandas.DataFrame(dict(zip(
+            columns, self._positions(records, [star] * attrs['dim']))),
+            columns=columns)
+        if attrs['type_code'] != gdxcc.GMS_DT_SET:
+            table['value'] = records['values']
+        return table
+
+    def special_values(self, name):
+        """Return the records of Parameter *name* with GAMS special values.
+
+        The result is a :py:class:`pandas.DataFrame` like that returned by
+        :meth:`records`, containing only these records. The column 'value'
+        gives the name of the special value: 'UNDF', 'NA', '+INF', '-INF' or
+        'EPS'. For a loaded Symbol, these records are kept when it is loaded,
+        so the GDX file is not read again.
+        """
+        name = self._alias.get(name, name)
+        attrs = self._symbol_attrs(name)
+        empty = (numpy.empty((0, attrs['dim']), dtype=numpy.intp),
+                 numpy.empty(0, dtype=numpy.int8))
+        if self._state[name] is True:
+            labels, kinds = self._specials.get(name, empty)
+        else:
+            records = self._load_records(name)
+            labels, kinds = (self._special_labels(
+                records['elements'], records['codes'], records['special'])
+                if 'special' in records else empty)
+
+        star = self['*'].to_index()
+        columns = _column_names(attrs['domain'])
+        table = pandas.DataFrame(dict(
+            (c, pandas.Categorical.from_codes(labels[:, j], categories=star))
+            for j, c in enumerate(columns)), columns=columns)
+        names = [special_str[v] for v in sorted(special_str)]
+        table['value'] = pandas.Categorical.from_codes(kinds, categories=names)
+        return table
+
+    def _special_labels(self, elements, codes, special):
+        """Return the labels of the records with GAMS special values.
+
+        *elements* and *codes* are the records of a Symbol, as for
+        :meth:`_cache_data`, and *special* the positions and kinds of the
+        records with special values among them. Returns a (records × dim)
+        array of the positions in '*' of their labels, and their kinds.
+        """
+        positions, kinds = special
+        star = self['*'].to_index()
+        labels = numpy.empty((len(positions), len(elements)),
+                             dtype=numpy.intp)
+        for j, e in enumerate(elements):
+            labels[:, j] = star.get_indexer([e[c] for c in
+                                             codes[positions, j]])
+        return labels, kinds
+
+    def element_text(self, name):
+        """Return the explanatory texts of the elements of GAMS Set *name*.
+
+        The texts are read from the GDX file on the first call, and stored as a
+        string coordinate named ``_<name>_text`` along the dimension of the
+        1-D Set *name*. Elements without text have ``''``.
+        """
+        name = self._alias.get(name, name)
+        assert self[name].attrs['_gdx_type_code'] == gdxcc.GMS_DT_SET and \
+            self[name].attrs['_gdx_dim'] == 1, \
+            'Variable {} is not a 1-D GAMS Set'.format(name)
+        coord = '_{}_text'.format(name)
+
+        if coord not in self.coords:
+            # The cached values of a 1-D Set are text numbers. Read each
+            # distinct text once; number 0 indicates no text
+            records = self._load_records(name)
+            numbers, inverse = numpy.unique(records['values'].astype(int),
+                                            return_inverse=True)
+            self._open()
+            texts = numpy.array([self._api.get_elem_text(int(n))[0] if n else
+                                 '' for n in numbers], dtype=object)
+
+            # Arrange along the Set's dimension
+            data = numpy.empty(len(self[name]), dtype=object)
+            data[records['codes'][:, 0]] = texts[inverse]
+            self.coords[coord] = (name, data)
+
+        return self[coord]
+
+    def set(self, name, as_dict=False):
+        """Return the elements of GAMS Set *name*.
+
+        For a 1-D Set, a list of elements is returned. If *as_dict* is
+        ``True``, an :py:class:`collections.OrderedDict` is returned instead,
+        mapping every element of the parent Set to ``True`` if it appears in
+        *name*, or ``False`` otherwise.
+
+        """
+        assert self[name].attrs['_gdx_type_code'] == gdxcc.GMS_DT_SET, \
+            'Variable {} is not a GAMS Set'.format(name)
+        if len(self[name].dims) > 1:
+            return self[name]
+        elif as_dict:
+            from collections import OrderedDict
+            parent = self[name].attrs['_gdx_domain'][0]
+            return OrderedDict(zip(self[parent].values,
+                                   self._mask(name, parent).tolist()))
+        else:
+            return list(self[name].values)
+
+    def sets(self):
+        """Return a list of all GDX Sets."""
+        return self._loaded_and_cached(gdxcc.GMS_DT_SET)
+
+    def parameters(self):
+        """Return a list of all GDX Parameters."""
+        return self._loaded_and_cached(gdxcc.GMS_DT_PAR)
+
+    def __reduce_ex__(self, protocol):
+        """Support pickling, e.g. to send a :class:`File` to other processes.
+
+        Loaded Symbols are pickled with their data. :py:mod:`numpy` arrays
+        support pickle protocol 5, so these can be sent as out-of-band
+        buffers, without copying. Symbols which are not loaded are pickled as
+        their metadata only, and lazy-loaded from the file by the receiver;
+        the file must be accessible at the same path.
+        """
+        from .shm import _multiindex_levels
+
+        variables = {}
+        levels = _multiindex_levels(self._variables)
+        for name, var in self._variables.items():
+            if name in self._alias or name in levels:
+                continue  # Restored from the parent Set, or the MultiIndex
+            data = (var.to_index() if isinstance(var, xr.IndexVariable) else
+                    var.data)
+            variables[name] = (var.dims, data, var.attrs)
+
+        state = {
+            'attrs': dict(self.attrs),
+            'variables': variables,
+            'coords': set(self.coords) - set(self._alias) - levels,
+            }
+        for k in ('filename', 'index', 'state', 'alias', 'implicit',
+                  'members', 'specials', 'density', 'max_bytes', 'dedupe',
+                  'special',
+                  'mmap'):
+            state[k] = getattr(self, '_' + k)
+        return (_unpickle, (state,))
+
+    def get_symbol_by_index(self, index):
+        """Retrieve the GAMS Symbol from the *index*-th position of the
+        :class:`File`."""
+        return self[self._index[index]]
+
+    def __getitem__(self, key):
+        """Set element access."""
+        try:
+            return super(File, self).__getitem__(key)
+        except KeyError as e:
+            if isinstance(self._state[key], dict):
+                debug('Lazy-loading {}'.format(key))
+                self._load_symbol_data(key)
+                return super(File, self).__getitem__(key)
+            else:
+                raise raise_from(KeyError(key), e)
+
+
+def _unpickle(state):
+    """Reconstruct a :class:`File` pickled by :meth:`File.__reduce_ex__`."""
+    variables = state.pop('variables')
+    coords = state.pop('coords')
+
+    result = File.__new__(File)
+    super(File, result).__init__(
+        {k: v for k, v in variables.items() if k not in coords},
+        {k: v for k, v in variables.items() if k in coords},
+        state.pop('attrs'))
+    for k, v in state.items():
+        setattr(result, '_' + k, v)
+    result._records = {}
+    result._interned = {}
+
+    # Aliases share the variable of their parent Set
+    for name, parent in result._alias.items():
+        if parent not in result._variables:
+            continue  # Added when the parent Set is loaded
+        result._variables[name] = result._variables[parent]
+        super(File, result).set_coords(name, inplace=True)
+
+    return result
@@ -1,15 +1,27 @@
 import sys
 
-from builtins import filter, range, object, super, zip
-from future.standard_library import install_aliases
-from future.utils import raise_from
-
 PY3 = sys.version_info[0] >= 3
 
 if PY3:
+    from builtins import filter, range, object, super, zip
     from builtins import FileNotFoundError
     from shutil import which
+    from weakref import finalize
+
+    def install_aliases():
+        """No-op; the Python 3 standard library needs no aliases."""
+        pass
+
+    def raise_from(value, from_value):
+        """Raise *value* with *from_value* as its cause."""
+        value.__cause__ = from_value
+        raise value
 else:  # pragma: no cover
+    from builtins import filter, range, object, super, zip
+    from future.standard_library import install_aliases
+    from future.utils import raise_from
+
     class FileNotFoundError(OSError):
         pass
     from backports.shutil_which import which
+    from backports.weakref import finalize
@@ -0,0 +1,158 @@
+# coding: utf-8
+"""Sharing loaded GDX data between processes using shared memory.
+
+A :class:`gdx.File` is loaded once and published with :meth:`gdx.File.share`
+(or :func:`publish`). Other processes :func:`attach` to the shared memory
+block by name, and receive an :py:class:`xarray.Dataset` whose numeric arrays
+are zero-copy, read-only views on the block:
+
+>>> shm = gdx.File('example.gdx', lazy=False).share()
+>>> # In another process:
+>>> ds = gdx.shm.attach(shm.name)
+
+The publishing process must keep *shm* and call ``shm.unlink()`` when the data
+is no longer needed. Requires Python 3.8 or later.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+import pickle
+import struct
+import sys
+
+import numpy
+import pandas
+import xarray as xr
+
+
+__all__ = [
+    'attach',
+    'publish',
+    ]
+
+
+#: Alignment, in bytes, of arrays within a shared memory block.
+ALIGN = 64
+
+# Header length, as an unsigned 64-bit integer
+_length = struct.Struct('<Q')
+
+# Blocks attached by this process. Views on a block are only valid while the
+# SharedMemory object is referenced.
+_attached = {}
+
+# Names of blocks published by this process
+_published = set()
+
+
+def _zero_copy(data):
+    """Return :obj:`True` if *data* can be placed in shared memory."""
+    return isinstance(data, numpy.ndarray) and data.dtype.kind in 'biufc'
+
+
+def _multiindex_levels(variables):
+    """Return the names of the levels of MultiIndex coordinates.
+
+    Recent versions of :py:mod:`xarray` store each level of a
+    :py:class:`pandas.MultiIndex` as a variable in *variables*. These are
+    not stored separately, but recreated with the MultiIndex.
+    """
+    result = set()
+    for key, var in variables.items():
+        if isinstance(var, xr.IndexVariable) and key == var.dims[0]:
+            index = var.to_index()
+            if isinstance(index, pandas.MultiIndex):
+                result.update(set(index.names) - {key})
+    return result
+
+
+def publish(ds, name=None):
+    """Copy the variables of *ds* into a new shared memory block.
+
+    *ds* is a :class:`gdx.File` or any :py:class:`xarray.Dataset`; only
+    Symbols which are already loaded are published. The block is named
+    *name*, or given a random name if *name* is :obj:`None`.
+
+    Numeric arrays are copied into the block once. Other data, such as the
+    labels of coordinates, are stored in a pickled header at the start of the
+    block. Returns the :py:class:`multiprocessing.shared_memory.SharedMemory`.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    # Describe each variable, and assign offsets for numeric arrays
+    variables = []
+    offset = 0
+    arrays = []
+    levels = _multiindex_levels(ds.variables)
+    for key, var in ds.variables.items():
+        if key in levels:
+            continue
+        info = {
+            'name': key,
+            'dims': var.dims,
+            'attrs': dict(var.attrs),
+            'coord': key in ds.coords,
+            }
+        data = var.values if isinstance(var, xr.IndexVariable) else var.data
+        if _zero_copy(data):
+            info.update(dtype=data.dtype.str, shape=data.shape, offset=offset)
+            arrays.append((offset, data))
+            offset += -(-data.nbytes // ALIGN) * ALIGN
+        elif isinstance(var, xr.IndexVariable):
+            info['data'] = var.to_index()
+        else:
+            info['data'] = data
+        variables.append(info)
+
+    header = pickle.dumps({'attrs': dict(ds.attrs), 'variables': variables},
+                          protocol=pickle.HIGHEST_PROTOCOL)
+    start = -(-(_length.size + len(header)) // ALIGN) * ALIGN
+
+    shm = SharedMemory(name=name, create=True, size=max(start + offset, 1))
+    _published.add(shm.name)
+    _length.pack_into(shm.buf, 0, len(header))
+    shm.buf[_length.size:_length.size + len(header)] = header
+    for offset, data in arrays:
+        numpy.ndarray(data.shape, data.dtype, buffer=shm.buf,
+                      offset=start + offset)[...] = data
+
+    return shm
+
+
+def attach(name):
+    """Attach to the shared memory block *name*, created by :func:`publish`.
+
+    Returns an :py:class:`xarray.Dataset` with the same variables,
+    coordinates and attributes as the published data. Numeric arrays are
+    read-only views on the shared memory.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    if name not in _attached:
+        if sys.version_info >= (3, 13):
+            shm = SharedMemory(name=name, track=False)
+        else:  # pragma: no cover
+            shm = SharedMemory(name=name)
+            if name not in _published:
+                # Don't unlink the block when this process exits
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, 'shared_memory')
+        _attached[name] = shm
+    shm = _attached[name]
+
+    length = _length.unpack_from(shm.buf, 0)[0]
+    header = pickle.loads(shm.buf[_length.size:_length.size + length])
+    start = -(-(_length.size + length) // ALIGN) * ALIGN
+
+    data_vars = {}
+    coords = {}
+    for info in header['variables']:
+        if 'offset' in info:
+            data = numpy.ndarray(info['shape'], numpy.dtype(info['dtype']),
+                                 buffer=shm.buf, offset=start + info['offset'])
+            data.flags.writeable = False
+        else:
+            data = info['data']
+        var = xr.Variable(info['dims'], data, info['attrs'])
+        (coords if info['coord'] else data_vars)[info['name']] = var
+
+    return xr.Dataset(data_vars, coords, attrs=header['attrs'])
@@ -1,3 +1,7 @@
+import re
+import subprocess
+import sys
+
 import numpy as np
 import pytest
 import xarray as xr
@@ -113,6 +117,224 @@ def test_implicit(gdxfile_explicit):
     assert gdxfile_explicit['p7'].shape == (N, N)
 
 
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='lazy imports require Python 3.7')
+def test_import():
+    # Importing gdx does not import heavy dependencies
+    code = 'import sys; import gdx; print(" ".join(sys.modules))'
+    modules = subprocess.check_output([sys.executable, '-c', code])
+    heavy = {'gdxcc', 'numpy', 'pandas', 'xarray'}
+    assert not set(modules.decode().split()) & heavy
+
+
+def test_select(rawgdx, monkeypatch):
+    def loaded(f):
+        return set(name for name, state in f._state.items() if state is True)
+
+    # Selected Symbols, the Sets in their domains, the parent of s1, and its
+    # Alias
+    f = gdx.File(rawgdx, include=['p3', 'p4'], lazy=False)
+    assert loaded(f) == {'*', 's', 's_', 't', 's1', 'p3', 'p4'}
+    # Other Symbols are loaded lazily
+    assert f['p1'].loc['a'] == 1
+
+    # Regular expressions, and types
+    f = gdx.File(rawgdx, include=[re.compile('s[56]')], types=['set'])
+    assert loaded(f) == {'*', 's5', 's6'}
+
+    # Sets in the domains of excluded Symbols (s1) are not loaded
+    f = gdx.File(rawgdx, types=['parameter'], exclude=['p[4-7]'], lazy=False)
+    assert loaded(f) == {'*', 's', 's_', 't', 'pi', 'p1', 'p2', 'p3'}
+
+    # Aliases are added with their parent Set
+    f = gdx.File(rawgdx, include=['s_'])
+    assert loaded(f) == {'*', 's', 's_'}
+    assert 's_' in f.sets() and 'u' in f.sets()
+    # Aliases not yet added can be described
+    assert gdx.File(rawgdx, include=['p2']).info('s_').endswith(
+        'alias s_(s), 0 records: Aliased with s')
+
+    # Arguments are checked before a handle is taken from the pool
+    monkeypatch.setattr(gdx.pool, 'acquire', None)
+    with pytest.raises(ValueError):
+        gdx.File(rawgdx, types=['foo'])
+
+
+def test_special(tmpdir, monkeypatch):
+    tmpdir.join('special.gms').write("""
+set i / a, b, c, d, e, f /;
+parameter p(i) / a 1, b eps, c na, d inf, e -inf /;
+parameter q(i) / a 1, b 2 /;
+execute_unload 'special.gdx', i, p, q;
+""")
+    subprocess.call(['gams', 'special.gms', 'lo=0'], cwd=str(tmpdir))
+    filename = str(tmpdir.join('special.gdx'))
+
+    p = gdx.File(filename)['p']
+    assert p.loc['a'] == 1
+    assert p.loc['b'] == 0 and np.signbit(p.loc['b'])
+    assert np.isnan(p.loc['c'])
+    assert p.loc['d'] == np.inf and p.loc['e'] == -np.inf
+
+    # Representations can be changed
+    f = gdx.File(filename, special={'EPS': 0., 'NA': -1.})
+    assert not np.signbit(f['p'].loc['b'])
+    assert f['p'].loc['c'] == -1
+
+    # Records with special values, of Symbols not loaded
+    assert len(gdx.File(filename).special_values('p')) == 4
+    assert len(f.special_values('q')) == 0
+    assert 'special' not in f._records['q']
+
+    # Loaded Symbols, including those streamed into a memmap in batches, keep
+    # these records; the file is not read again
+    monkeypatch.setattr(gdx.file, '_mmap_batch', 2)
+    f2 = gdx.File(filename, max_bytes=8, mmap=True)
+    assert f2['p'].attrs['_gdx_layout'] == 'mmap'
+    monkeypatch.setattr(gdx.File, '_cache_data', None)
+    for sv in f.special_values('p'), f2.special_values('p'):
+        assert list(sv['i']) == ['b', 'c', 'd', 'e']
+        assert list(sv['value']) == ['EPS', 'NA', '+INF', '-INF']
+
+
+def test_refresh(tmpdir, monkeypatch):
+    def write(text):
+        tmpdir.join('refresh.gms').write(text +
+                                         "\nexecute_unload 'refresh.gdx'")
+        subprocess.call(['gams', 'refresh.gms', 'lo=0'], cwd=str(tmpdir))
+        return str(tmpdir.join('refresh.gdx'))
+
+    text = """
+set i / a, b, c /;
+set j / x, y /;
+set k / z /;
+parameter p(i) / a 1 /;
+parameter q(i) / b 2 /;
+parameter r(j) / x 3 /;
+"""
+    f = gdx.File(write(text), lazy=False)
+    i, q = f._intern(f._members['i'])[1], f['q'].values
+    assert f.refresh() == set()
+
+    # Change a Parameter
+    f.close()
+    text = text.replace('a 1', 'a 4')
+    write(text)
+    assert f.refresh() == {'p'}
+    assert f['p'].loc['a'] == 4
+    # Unchanged data is kept
+    assert f._intern(f._members['i'])[1] is i
+    assert np.shares_memory(f['q'].values, q)
+
+    # Change a Set; Parameters indexed by the Set are also reloaded
+    f.close()
+    text = text.replace('x, y', 'x, y, z')
+    write(text)
+    assert f.refresh() == {'j', 'r'}
+    assert list(f['r'].coords['j'].values) == ['x', 'y', 'z']
+    assert np.shares_memory(f['q'].values, q)
+
+    # New labels change '*'; everything is reloaded
+    f.close()
+    write(text.replace('a, b, c', 'a, b, c, d'))
+    assert f.refresh() == {'*', 'i', 'j', 'k', 'p', 'q', 'r'}
+    assert f['q'].shape == (4,)
+    f.close()
+
+    # Symbols with the 'long' layout are reloaded with a new MultiIndex
+    monkeypatch.setitem(sys.modules, 'sparse', None)
+    f = gdx.File(write(text), lazy=False, max_bytes=8)
+    assert f['p'].attrs['_gdx_layout'] == 'long'
+    f.close()
+    write(text.replace('a 4', 'a 4, c 5'))
+    assert f.refresh() == {'p'}
+    assert f['p'].to_series().tolist() == [4, 5]
+    f.close()
+    write(text.replace('a 4', 'b 6'))
+    assert f.refresh() == {'p'}
+    assert f['p'].shape == (1,)
+    assert f.extract('p').to_series().tolist() == [6]
+    f.close()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8),
+                    reason='shared memory requires Python 3.8')
+def test_share(rawgdx, monkeypatch):
+    from gdx.shm import attach
+
+    f = gdx.File(rawgdx, lazy=False)
+    shm = f.share()
+    try:
+        # Attach from another process
+        code = ('from gdx.shm import attach; ds = attach({!r}); '
+                'print(float(ds["p3"].sum()), ds["p7"].dims[0])')
+        out = subprocess.check_output([sys.executable, '-c',
+                                       code.format(shm.name)])
+        assert out.decode().split() == ['7.0', f['p7'].dims[0]]
+
+        ds = attach(shm.name)
+        for name in 'p3', 's3', 's', 'pi':
+            assert ds[name].equals(f[name])
+            assert ds[name].attrs == f[name].attrs
+        assert not ds['p3'].values.flags.writeable
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # Symbols with the 'long' layout
+    monkeypatch.setitem(sys.modules, 'sparse', None)
+    f = gdx.File(rawgdx, lazy=False, max_bytes=8)
+    assert f['s3'].attrs['_gdx_layout'] == 'long'
+    shm = f.share()
+    try:
+        ds = attach(shm.name)
+        for name in 'p3', 's3':
+            assert ds[name].to_series().equals(f[name].to_series())
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8),
+                    reason='pickle protocol 5 requires Python 3.8')
+def test_pickle(rawgdx, actual, monkeypatch, tmpdir):
+    import pickle
+
+    f = gdx.File(rawgdx)
+    f['p3']
+    buffers = []
+    data = pickle.dumps(f, protocol=5, buffer_callback=buffers.append)
+    assert len(buffers)
+
+    f2 = pickle.loads(data, buffers=buffers)
+    assert isinstance(f2, gdx.File)
+    # Loaded data is not copied
+    assert np.shares_memory(f2['p3'].values, f['p3'].values)
+    # Unloaded Symbols are loaded from the file
+    assert 'p6' not in f2.data_vars
+    assert f2['p6'].dims == actual['p6'].dims
+    assert f2.extract('p1').equals(actual['p1'])
+    assert f2.dealias('s_').equals(f['s'])
+    assert f2.info('p2') == f.info('p2')
+
+    # Other protocols
+    assert pickle.loads(pickle.dumps(f))['p3'].equals(f['p3'])
+
+    # Symbols with the 'long' layout
+    monkeypatch.setitem(sys.modules, 'sparse', None)
+    f = gdx.File(rawgdx, lazy=False, max_bytes=8)
+    assert f['p3'].attrs['_gdx_layout'] == 'long'
+    f2 = pickle.loads(pickle.dumps(f, protocol=5))
+    for name in 'p3', 's3':
+        assert f2[name].to_series().equals(f[name].to_series())
+    assert f2.extract('p3').to_series().equals(f.extract('p3').to_series())
+
+    # Unloaded Symbols are loaded from the same file, in any directory
+    f2 = pickle.loads(pickle.dumps(gdx.File(rawgdx)))
+    monkeypatch.chdir(tmpdir)
+    assert f2['p1'].loc['a'] == 1
+
+
 class TestAPI:
     def test_gdx(self):
         gdx.GDX()
@@ -124,6 +346,15 @@ class TestAPI:
         with pytest.raises(AttributeError):
             api.not_a_method()
 
+    def test_pool(self, rawgdx):
+        api = gdx.pool.acquire()
+        api.open_read(rawgdx)
+        gdx.pool.release(api)
+        # The released handle is reused, and can open another file
+        assert gdx.pool.acquire() is api
+        api.open_read(rawgdx)
+        gdx.pool.release(api)
+
 
 class TestFile:
     def test_init(self, rawgdx):
@@ -132,6 +363,42 @@ class TestFile:
         with pytest.raises(FileNotFoundError):
             gdx.File('nonexistent.gdx')
 
+    def test_close(self, rawgdx):
+        with gdx.File(rawgdx) as f:
+            f['p1']
+        assert f._api is None
+        # Loaded data remains available; lazy-loading reopens the file
+        assert f['p1'].loc['a'] == 1
+        assert f['p2'].loc['r'] == 0.1
+        f.close()
+        # Reading element texts also reopens the file
+        assert f.element_text('s').loc['a'] == 'Aardvark'
+        f.close()
+
+    def test_release(self, rawgdx, monkeypatch):
+        import gc
+
+        released = []
+        release = gdx.pool.release
+        monkeypatch.setattr(gdx.pool, 'release', lambda api:
+                            released.append(api) or release(api))
+
+        # Files that are not closed return their handles when discarded
+        f = gdx.File(rawgdx)
+        api = f._api
+        del f
+        gc.collect()
+        assert released == [api]
+
+        # Also after lazy-loading reopens a closed File
+        with gdx.File(rawgdx) as f:
+            pass
+        f['p1']
+        api = f._api
+        del f
+        gc.collect()
+        assert len(released) == 3 and released[-1] is api
+
     def test_num_parameters(self, gdxfile, actual):
         print(gdxfile.parameters())
         assert len(gdxfile.parameters()) == len(actual.data_vars)
@@ -185,19 +452,188 @@ class TestFile:
 
         gdxfile_explicit.extract('p5')
 
+        # No reduction is needed for p3, so the result can be a view
+        assert np.shares_memory(gdxfile.extract('p3', copy=False).values,
+                                gdxfile['p3'].values)
+        assert not np.shares_memory(gdxfile.extract('p3').values,
+                                    gdxfile['p3'].values)
+
         with pytest.raises(KeyError):
             gdxfile.extract('notasymbolname')
 
+    def test_records_freed(self, rawgdx, actual, monkeypatch):
+        # Records are not kept once Symbols are loaded
+        f = gdx.File(rawgdx, lazy=False)
+        assert f._records == {}
+        # Loaded Symbols are extracted without reading the file again
+        f.close()
+        monkeypatch.setattr(gdx.File, '_cache_data', None)
+        for name in ['p1', 'p3', 'p6']:
+            assert f.extract(name).equals(actual[name])
+        assert f.extract('s4').shape == (7, 7, 4)
+        assert f._records == {} and f._api is None
+
+    def test_query(self, rawgdx):
+        f = gdx.File(rawgdx)
+        # p3 is 1 for all animals where the colour is 'y'
+        result = f.query('p3', where='value > 0', within=['s3'])
+        assert len(result) == 7
+        assert set(result['t']) == {'y'}
+        assert len(f.query('p3', within=['s1'])) == 4
+        with pytest.raises(ValueError):
+            f.query('p3', within=['s5'])
+        assert len(f.query('p3', within={'s5': ['s']})) == 3
+        # Group-by aggregation
+        result = f.query('p3', by='t', agg='sum')
+        assert result.set_index('t')['value']['y'] == 7
+        assert (f.query('s3', by='s')['value'] == 7).all()
+        # Records of a Set
+        assert list(f.records('s4').columns) == ['s', 't', 'u']
+        # Parameters are not loaded
+        assert 'p3' not in f.data_vars
+
+    def test_layout(self, rawgdx, actual):
+        def check_extract(f, name):
+            # Extracted in the same layout; no dense array is allocated
+            result = f.extract(name)
+            expected = actual[name].to_series().dropna()
+            if f[name].attrs['_gdx_layout'] == 'long':
+                series = result.to_series()
+                assert list(series.index.names) == list(actual[name].dims)
+                assert series.sort_index().equals(expected.sort_index())
+            else:
+                assert result.data.nnz == len(expected)
+
+        # p3 has 49 elements, but only 7 records
+        f = gdx.File(rawgdx, density=0.5)
+        assert f['p2'].attrs['_gdx_layout'] == 'dense'
+        assert f['p3'].attrs['_gdx_layout'] in ('sparse', 'long')
+        assert f['p3'].attrs['_gdx_dense_nbytes'] == 49 * 8
+        check_extract(f, 'p3')
+        # p6 and s4 are larger than 64 bytes
+        f = gdx.File(rawgdx, max_bytes=64)
+        assert f['p6'].attrs['_gdx_layout'] in ('sparse', 'long')
+        assert f['s4'].attrs['_gdx_layout'] in ('sparse', 'long')
+        assert f['p4'].attrs['_gdx_layout'] == 'dense'
+        if f['p3'].attrs['_gdx_layout'] == 'long':
+            assert f['p3'].shape == (7,)
+            assert f['p3'].to_series()['a', 'y'] == 1
+        check_extract(f, 'p3')
+        assert f.extract('s4').size == 28 or f.extract('s4').data.nnz == 28
+
+    def test_dedupe(self, rawgdx, tmpdir):
+        f1 = gdx.File(rawgdx, dedupe=True)
+        f2 = gdx.File(rawgdx, dedupe=True)
+        for name in '*', 's', 'p3', 'p7', 's3':
+            fp = f1[name].attrs['_gdx_fingerprint']
+            assert fp == f2[name].attrs['_gdx_fingerprint']
+            if name in ('*', 's'):
+                # Identical coordinates are the same Index, from the store
+                index = gdx.file._store[('index', fp)]
+                for f in f1, f2:
+                    assert any(i is index for i in f._interned.values())
+            else:
+                # Identical Symbols share memory
+                assert np.shares_memory(f1[name].values, f2[name].values)
+        assert fp != f1['p2'].attrs['_gdx_fingerprint']
+        assert not f1['p3'].values.flags.writeable
+        # Without dedupe, no memory is shared
+        assert not np.shares_memory(gdx.File(rawgdx)['p3'].values,
+                                    f1['p3'].values)
+
+        # A Parameter does not share the data of a Set with the same records
+        tmpdir.join('dedupe.gms').write("""
+set i / a, b /;
+set s(i, i) / a.b /;
+parameter p(i, i) / a.b eps /;
+execute_unload 'dedupe.gdx', i, s, p;
+""")
+        subprocess.call(['gams', 'dedupe.gms', 'lo=0'], cwd=str(tmpdir))
+        f = gdx.File(str(tmpdir.join('dedupe.gdx')), dedupe=True,
+                     special={'EPS': 0.})
+        assert f['s'].dtype == bool and f['p'].dtype == float
+        assert np.nansum(f['p'].values) == 0
+        assert np.isfinite(f['p'].values).sum() == 1
+
+    def test_mmap(self, rawgdx, actual, tmpdir, monkeypatch):
+        f0 = gdx.File(rawgdx, lazy=False)
+
+        # Stream in several batches, without caching the records
+        monkeypatch.setattr(gdx.file, '_mmap_batch', 3)
+        cached = []
+        cache_data = gdx.File._cache_data
+        monkeypatch.setattr(gdx.File, '_cache_data', lambda self, name, *args:
+                            cached.append(name) or
+                            cache_data(self, name, *args))
+        f = gdx.File(rawgdx, max_bytes=64, mmap=True)
+        for name in 'p3', 's4', 'p7':
+            assert f[name].attrs['_gdx_layout'] == 'mmap'
+            assert f[name].equals(f0[name])
+            # The fingerprint is the same as when the records are cached
+            assert f[name].attrs['_gdx_fingerprint'] == \
+                f0[name].attrs['_gdx_fingerprint']
+            assert name not in cached
+        assert f['p4'].attrs['_gdx_layout'] == 'dense'
+        assert f.extract('p3').equals(actual['p3'])
+        # Copied in blocks into a new memmap, not in memory
+        p3 = f.extract('p3')
+        assert isinstance(p3.values.base, np.memmap)
+        assert not np.shares_memory(p3.values, f['p3'].values)
+        # Empty results are built in memory
+        assert f.extract('p5').equals(f0.extract('p5'))
+        # Unchanged; checked without caching the records
+        del cached[:]
+        assert f.refresh() == set()
+        assert 'p3' not in cached and f._records == {}
+
+        # Persistent files, not shared with other Files
+        f = gdx.File(rawgdx, max_bytes=64, mmap=str(tmpdir))
+        f2 = gdx.File(rawgdx, max_bytes=64, mmap=str(tmpdir))
+        p3 = f['p3'].values
+        path = f['p3'].attrs['_gdx_mmap_file']
+        assert path != f2['p3'].attrs['_gdx_mmap_file']
+        np.testing.assert_array_equal(np.load(path, mmap_mode='r'), p3)
+        np.testing.assert_array_equal(f2['p3'].values, p3)
+        assert np.shares_memory(f.extract('p3', copy=False).values,
+                                f['p3'].values)
+        extracted = f.extract('p3').attrs['_gdx_mmap_file']
+        assert extracted != path and extracted.startswith(str(tmpdir))
+        np.testing.assert_array_equal(np.load(extracted, mmap_mode='r'), p3)
+
     def test_implicit(self, gdxfile):
         assert gdxfile['p7'].shape == (3, 3)
+        # Implicit sets are named for their contents
+        assert all(d.startswith('_star_') for d in gdxfile['p7'].dims)
+        # Identical coordinates share a single interned Index
+        keys = set(gdxfile._interned)
+        s5, s6 = [gdxfile._intern(gdxfile._members[s])[1] for s in
+                  ('s5', 's6')]
+        assert s5 is s6 and set(gdxfile._interned) == keys
+        assert s5.equals(gdxfile['s6'].to_index())
 
 
 class TestSet:
+    def test_element_text(self, gdxfile):
+        text = gdxfile.element_text('s')
+        assert text.loc['b'] == 'Blue whale'
+        assert text.loc['g'] == 'Grasshopper'
+        assert gdxfile.element_text('s_').loc['a'] == 'Aardvark'
+        # No texts are given for s1
+        assert all(gdxfile.element_text('s1') == '')
+
     def test_len(self, gdxfile, actual):
         assert len(gdxfile.s) == len(actual['s'])
         assert len(gdxfile.set('s1')) == len(actual['s1'])
         assert len(gdxfile.set('s2')) == len(actual['s2'])
 
+    def test_as_dict(self, gdxfile, actual):
+        s1 = gdxfile.set('s1', as_dict=True)
+        assert list(s1.keys()) == list(gdxfile.s.values)
+        assert [k for k, v in s1.items() if v] == list(actual['s1'].values)
+        # Aliases have the same members as their parent
+        assert gdxfile.set('s_', as_dict=True) == \
+            gdxfile.set('s', as_dict=True)
+
     def test_getitem(self, gdxfile):
         for i in range(len(gdxfile.s)):
             gdxfile.s[i]
@@ -225,3 +661,34 @@ class TestSet:
         assert list_cmp(domain('s2'), ['s'])
         assert list_cmp(domain('s3'), ['s', 't'])
         assert list_cmp(domain('s4'), ['s', 't', 'u'])
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_convert(rawgdx, tmpdir, format):
+    pa = pytest.importorskip('pyarrow')
+    from gdx.__main__ import main
+
+    out_dir = str(tmpdir)
+    assert main(['convert', rawgdx, out_dir, '--format', format,
+                 '--workers', '2', '--batch-size', '3']) == 0
+
+    path = str(tmpdir.join('p3.{}'.format(format)))
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        # Each row group has a dictionary of only the labels it uses
+        pf = pq.ParquetFile(path)
+        assert [len(pf.read_row_group(i).column('s').chunk(0).dictionary) for
+                i in range(pf.num_row_groups)] == [3, 3, 1]
+    else:
+        table = pa.ipc.open_file(path).read_all()
+    assert table.column_names == ['s', 't', 'value']
+    assert pa.types.is_dictionary(table.schema.field('s').type)
+    assert table.num_rows == 7
+    assert set(table.column('t').to_pylist()) == {'y'}
+    assert set(table.column('value').to_pylist()) == {1}
+
+    # Sets have no value column; repeated dimensions are numbered
+    assert tmpdir.join('s7.{}'.format(format)).check()
+    # Equations and aliases are not converted
+    assert not tmpdir.join('e1.{}'.format(format)).check()
@@ -8,10 +8,15 @@ setup(name='gdx',
       author_email='mail@paul.kishimoto.name',
       description='GAMS Data Exchange (GDX) file access',
       install_requires=[
-        'backports.shutil_which',
-        'future',
+        'backports.shutil_which; python_version < "3"',
+        'backports.weakref; python_version < "3"',
+        'future; python_version < "3"',
         'xarray',
         ],
+      extras_require={
+        'arrow': ['pyarrow'],
+        'sparse': ['sparse'],
+        },
       tests_require=['pytest'],
       url='https://github.com/khaeru/py-gdx',
       download_url='https://github.com/khaeru/py-gdx/tarball/3',